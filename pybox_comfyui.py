@@ -1,8 +1,15 @@
 import os
+import copy
+import time
 import datetime
 import uuid
+import json
+import hashlib
+import sqlite3
 import shutil
 import tempfile
+import urllib.error
+import urllib.request
 from enum import Enum
 from pathlib import Path
 from pprint import pprint
@@ -50,6 +57,64 @@ UI_INTERRUPT = "Interrupt"
 UI_OUT_WIDTH = "Width"
 UI_OUT_HEIGHT = "Height"
 
+UI_PROXY = "Proxy"
+UI_PROXY_FACTOR = "Proxy factor"
+
+PROXY_FACTORS = [2, 4, 8]
+PROXY_SUFFIX = "_proxy"
+PROXY_RESOLUTION_ALIGN = 8
+PROXY_SETTLE_DELAY = 2.0
+PROXY_SCALE_IDX = "proxy_scale"
+
+WARMUP_SUFFIX = "_warmup"
+WARMUP_FACTOR = PROXY_FACTORS[-1]
+WARMUP_STEPS = 1
+
+LEDGER_FILENAME = "render_ledger.db"
+LEDGER_BATCH_SIZE = 16
+LEDGER_FLUSH_DELAY = 30.0
+LEDGER_BUSY_TIMEOUT = 5.0
+LEDGER_HISTORY_TIMEOUT = 5.0
+LEDGER_MODEL_FIELDS = [
+    "ckpt_name", 
+    "lora_name", 
+    "vae_name", 
+    "unet_name", 
+    "clip_name", 
+    "clip_name1", 
+    "clip_name2", 
+    "control_net_name", 
+    "style_model_name", 
+    "clip_vision_name", 
+    "upscale_model_name", 
+    "model_name",
+    ]
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    prompt_id TEXT PRIMARY KEY,
+    operator TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    frame INTEGER NOT NULL,
+    workflow_hash TEXT NOT NULL,
+    host TEXT NOT NULL,
+    proxy INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    queue_wait REAL,
+    execution_time REAL,
+    result_size INTEGER,
+    matte_size INTEGER,
+    warmup INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS render_models (
+    prompt_id TEXT NOT NULL,
+    model TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_operator_status_proxy_warmup_execution_time ON renders (operator, status, proxy, warmup, execution_time);
+CREATE INDEX IF NOT EXISTS renders_workflow_hash ON renders (workflow_hash);
+CREATE INDEX IF NOT EXISTS render_models_model ON render_models (model);
+"""
+
 UI_PROMPT_PREFIX = "Prompt"
 def UI_PROMPT(orientation, p):
     return " ".join([UI_PROMPT_PREFIX, orientation, str(p)]) 
@@ -87,8 +152,85 @@ class Status(str, Enum):
     IDLE = "Idle"
     WAITING = "Waiting"
     EXECUTING = "Executing"
+    FULL_RES = "Full resolution"
     PROCESSED = "Processed"
     FAILED = "Failed"
+    INTERRUPTED = "Interrupted"
+
+
+class RenderLedger:
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.pending = []
+        self.pending_since = 0.0
+        self.connection = sqlite3.connect(self.db_path, timeout=LEDGER_BUSY_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=DELETE")
+        self.connection.executescript(LEDGER_SCHEMA)
+    
+    
+    def record(self, render, models):
+        if not self.pending:
+            self.pending_since = time.time()
+        self.pending.append((render, models))
+        if len(self.pending) >= LEDGER_BATCH_SIZE:
+            self.flush()
+        else:
+            self.flush_if_due()
+    
+    
+    def flush_if_due(self):
+        if self.pending and time.time() - self.pending_since >= LEDGER_FLUSH_DELAY:
+            self.flush()
+    
+    
+    def flush(self):
+        if not self.pending:
+            return
+        renders = [render for render, _ in self.pending]
+        models = [{"prompt_id": render["prompt_id"], "model": model} 
+                  for render, render_models in self.pending for model in render_models]
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO renders VALUES ("
+                    ":prompt_id, :operator, :version, :frame, :workflow_hash, :host, :proxy, :status, "
+                    ":submitted_at, :queue_wait, :execution_time, :result_size, :matte_size, :warmup)",
+                    renders
+                    )
+                self.connection.executemany(
+                    "INSERT INTO render_models VALUES (:prompt_id, :model)", 
+                    models
+                    )
+        except sqlite3.OperationalError as e:
+            print(f"Render ledger write to {self.db_path} failed ({e}), {len(self.pending)} rows kept pending")
+            return
+        self.pending = []
+    
+    
+    def slowest_frames(self, operator, limit=10, proxy=False, status=Status.PROCESSED):
+        self.flush()
+        return self.connection.execute(
+            "SELECT version, frame, host, execution_time FROM renders "
+            "WHERE operator = ? AND status = ? AND proxy = ? AND warmup = 0 AND execution_time IS NOT NULL "
+            "ORDER BY execution_time DESC LIMIT ?",
+            (operator, status, int(proxy), limit)
+            ).fetchall()
+    
+    
+    def versions_using_model(self, model):
+        self.flush()
+        return self.connection.execute(
+            "SELECT DISTINCT renders.operator, renders.version FROM renders "
+            "JOIN render_models ON render_models.prompt_id = renders.prompt_id "
+            "WHERE render_models.model = ? AND renders.warmup = 0 "
+            "ORDER BY renders.operator, renders.version",
+            (model,)
+            ).fetchall()
+    
+    
+    def close(self):
+        self.flush()
+        self.connection.close()
 
 
 class ComfyUIBaseClass(pybox.BaseClass):
@@ -100,6 +242,7 @@ class ComfyUIBaseClass(pybox.BaseClass):
     operator_name = ""
     operator_layers = [LayerIn.FRONT, LayerOut.RESULT]
     operator_static = False
+    operator_warmup = False
     
     workflow_dir = ""
     workflow_path = ""
@@ -115,6 +258,19 @@ class ComfyUIBaseClass(pybox.BaseClass):
     processing = False
     force_processing = False
     
+    proxy = False
+    proxy_factor = PROXY_FACTORS[0]
+    proxy_key = None
+    full_res_pending = {}
+    full_res_key = None
+    full_res_entry = {}
+    
+    warmed_up = set()
+    warmup_prompts = {}
+    
+    ledger = None
+    submission = {}
+    
     ui_processing = Status.IDLE
     ui_version = UI_VERSION
     ui_processing_color_row = -1
@@ -134,6 +290,8 @@ class ComfyUIBaseClass(pybox.BaseClass):
     out_matte_basename = ""
     out_matte_filepath_pttrn = ""
     out_default_filepath = EMPTY_IMAGE_FILEPATH("black")
+    delivered_outputs = {}
+    output_polls = {}
     
     version_padding = 3
     frame_padding = 4
@@ -161,6 +319,37 @@ class ComfyUIBaseClass(pybox.BaseClass):
     
     def init_client(self):
         self.client_id = str(uuid.uuid4())
+    
+    
+    def get_prompt_timings(self, prompt_id):
+        try:
+            with urllib.request.urlopen(self.server_url + "/history/" + prompt_id, 
+                                        timeout=LEDGER_HISTORY_TIMEOUT) as response:
+                history = json.loads(response.read())
+        except (urllib.error.URLError, ValueError) as e:
+            print(f"Prompt {prompt_id} history unavailable on {self.server_address} ({e})")
+            return None
+        messages = history.get(prompt_id, {}).get("status", {}).get("messages", [])
+        timestamps = dict([(name, data.get("timestamp")) for name, data in messages])
+        started_at = timestamps.get("execution_start")
+        finished_at = (timestamps.get("execution_success") or 
+                       timestamps.get("execution_error") or 
+                       timestamps.get("execution_interrupted"))
+        if not started_at or not finished_at:
+            return None
+        return (started_at / 1000.0, finished_at / 1000.0)
+    
+    
+    def queue_prompt_front(self, workflow):
+        payload = json.dumps({"prompt": workflow, "client_id": self.client_id, "front": True}).encode("utf-8")
+        request = urllib.request.Request(self.server_url + "/prompt", data=payload, 
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+        except (urllib.error.URLError, ValueError) as e:
+            print(f"Workflow queueing on {self.server_address} failed ({e})")
+            return {}
 
     
     ###################################
@@ -286,6 +475,26 @@ class ComfyUIBaseClass(pybox.BaseClass):
             )
         self.add_global_elements(wfapi_intrrpt)
     
+    
+    def set_ui_proxy(self, row, col):
+        proxy_toggle = pybox.create_toggle_button(
+            UI_PROXY, False, default=False, 
+            row=row, col=col, tooltip="Render a proxy preview before the full resolution"
+            )
+        self.add_global_elements(proxy_toggle)
+    
+    
+    def set_ui_proxy_factor(self, row, col):
+        proxy_factors = pybox.create_popup(
+            UI_PROXY_FACTOR,
+            ["1/" + str(factor) for factor in PROXY_FACTORS],
+            value=0, 
+            default=0, 
+            row=row, col=col, 
+            tooltip="Proxy resolution factor"
+            )
+        self.add_global_elements(proxy_factors)
+    
         
     def set_ui_processing_color(self, color, status):
         if self.get_global_element(self.ui_processing):
@@ -343,23 +552,25 @@ class ComfyUIBaseClass(pybox.BaseClass):
                 self.workflow.get(self.workflow_load_exr_front_idx)["inputs"]["filepath"] = str(front_filepath)
     
     
-    def set_workflow_save_exr_filename_prefix(self, layers=[LayerOut.RESULT, LayerOut.OUTMATTE]):
-        if self.workflow: 
+    def set_workflow_save_exr_filename_prefix(self, layers=[LayerOut.RESULT, LayerOut.OUTMATTE], workflow=None, operator=None):
+        workflow = workflow if workflow is not None else self.workflow
+        operator = operator if operator else self.operator_name
+        if workflow: 
             version = self.get_version()
             frame = self.get_frame() if not self.operator_static else 0
-            dir_path = Path(COMFYUI_SERVER_OUTPUT_DIR) / self.get_project() / self.operator_name / self.get_version_str() 
+            dir_path = Path(COMFYUI_SERVER_OUTPUT_DIR) / self.get_project() / operator / self.get_version_str() 
             if LayerOut.RESULT in layers:
                 result_filepath = str(dir_path / self.out_result_basename)
                 print(f"Workflow SaveEXR result filepath {result_filepath} - v{version} - f{frame}")
-                self.workflow.get(self.workflow_save_exr_result_idx)["inputs"]["filename_prefix"] = result_filepath
-                self.workflow.get(self.workflow_save_exr_result_idx)["inputs"]["version"] = version
-                self.workflow.get(self.workflow_save_exr_result_idx)["inputs"]["start_frame"] = frame
+                workflow.get(self.workflow_save_exr_result_idx)["inputs"]["filename_prefix"] = result_filepath
+                workflow.get(self.workflow_save_exr_result_idx)["inputs"]["version"] = version
+                workflow.get(self.workflow_save_exr_result_idx)["inputs"]["start_frame"] = frame
             if LayerOut.OUTMATTE in layers:
                 matte_filepath = str(dir_path / self.out_matte_basename)
                 print(f"Workflow SaveEXR out matte filepath {matte_filepath} - v{version} - f{frame}")
-                self.workflow.get(self.workflow_save_exr_outmatte_idx)["inputs"]["filename_prefix"] = matte_filepath
-                self.workflow.get(self.workflow_save_exr_outmatte_idx)["inputs"]["version"] = version
-                self.workflow.get(self.workflow_save_exr_outmatte_idx)["inputs"]["start_frame"] = frame
+                workflow.get(self.workflow_save_exr_outmatte_idx)["inputs"]["filename_prefix"] = matte_filepath
+                workflow.get(self.workflow_save_exr_outmatte_idx)["inputs"]["version"] = version
+                workflow.get(self.workflow_save_exr_outmatte_idx)["inputs"]["start_frame"] = frame
     
     
     def prepare_workflow_execution(self):
@@ -371,7 +582,9 @@ class ComfyUIBaseClass(pybox.BaseClass):
         layer = LayerOut.RESULT
         version = self.get_version_str()
         frame = self.get_frame_str() if not self.operator_static else self.pad(0, self.frame_padding)
-        if self.frame_exists(operator, layer, version, frame):
+        self.set_proxy_info()
+        if (self.frame_exists(operator, layer, version, frame) or 
+            (self.proxy and self.frame_exists(self.get_proxy_operator_name(), layer, version, frame))):
             if not self.force_processing:
                 return
             else:
@@ -386,15 +599,39 @@ class ComfyUIBaseClass(pybox.BaseClass):
             self.prepare_workflow_execution()
             print("Workflow instanciation")
             self.workflow_setup()
-            print(f'Workflow queueing on {self.server_address} with client id {self.client_id}')
-            self.prompt_id = queue_prompt(self.workflow, self.client_id, server_address=self.server_address)
+            workflow = self.workflow
+            if self.proxy:
+                print(f"Workflow proxy instanciation (1/{self.proxy_factor})")
+                workflow = self.get_proxy_workflow()
+                if not workflow:
+                    print("Workflow proxy not supported, falling back to full resolution")
+                    workflow = self.workflow
+                    self.proxy = False
+            if self.full_res_key and self.processing:
+                self.interrupt_full_res_workflow()
+            full_res_key = (self.get_version_str(), frame)
+            self.drop_full_res_workflow(frame)
+            self.proxy_key = None
+            if self.proxy:
+                self.get_version_path(EndPoint.OUT, self.get_proxy_operator_name()).mkdir(parents=True, exist_ok=True)
+                self.full_res_pending[full_res_key] = {"workflow": copy.deepcopy(self.workflow), "proxy_done_at": 0.0}
+                self.proxy_key = full_res_key
+                print(f'Workflow proxy queueing on {self.server_address} with client id {self.client_id}')
+                self.prompt_id = self.queue_prompt_front(workflow)
+            else:
+                print(f'Workflow queueing on {self.server_address} with client id {self.client_id}')
+                self.prompt_id = queue_prompt(workflow, self.client_id, server_address=self.server_address)
             print(f'Workflow assigned prompt id {self.prompt_id}')
             if self.prompt_id:
                 self.processing = True
+                self.submission = self.get_submission(self.prompt_id, workflow, self.get_version(), 
+                                                      self.get_frame() if not self.operator_static else 0, 
+                                                      proxy=self.proxy)
     
     
     def interrupt_workflow(self):
         if self.client_id and self.processing:
+            self.record_submission(Status.INTERRUPTED)
             if self.prompt_id:
                 self.set_host_info()
                 print("Workflow execution interruption")
@@ -404,14 +641,19 @@ class ComfyUIBaseClass(pybox.BaseClass):
             self.processing = False
             self.set_global_element_value(UI_SUBMIT, False)
             self.set_ui_processing_color(Color.GRAY, Status.IDLE)
+        self.init_proxy()
         self.set_global_element_value(UI_INTERRUPT, False)
         self.force_processing = False
     
     
     def update_workflow_execution(self):
+        if self.ledger:
+            self.ledger.flush_if_due()
+        self.update_warmup_execution()
         if self.client_id and self.prompt_id:
             self.set_host_info()
             print(f'Workflow execution status')
+            status_node = None
             while(True):
                 response = prompt_execution(self.server_address, self.client_id, self.prompt_id["prompt_id"])
                 if response:
@@ -419,14 +661,34 @@ class ComfyUIBaseClass(pybox.BaseClass):
                                             response["node"]["type"] in [ComfyUIStatus.EXECUTING, 
                                                                         ComfyUIStatus.EXECUTION_CACHED])
                     if self.processing:
-                        self.set_ui_processing_color(Color.BLUE, Status.EXECUTING)
+                        if self.full_res_key:
+                            self.set_ui_processing_color(Color.YELLOW, Status.FULL_RES)
+                        else:
+                            self.set_ui_processing_color(Color.BLUE, Status.EXECUTING)
+                        if self.submission and not self.submission["started_at"]:
+                            self.submission["started_at"] = time.time()
+                        if response["node"] != status_node:
+                            status_node = response["node"]
+                            self.update_outputs(layers=self.operator_layers)
                     else:
+                        self.update_outputs(layers=self.operator_layers)
+                        self.warmed_up.add((self.server_address, self.operator_name))
+                        self.record_submission(Status.PROCESSED)
+                        if self.proxy_key in self.full_res_pending:
+                            self.full_res_pending[self.proxy_key]["proxy_done_at"] = time.time()
+                        self.proxy_key = None
+                        self.full_res_key = None
+                        self.full_res_entry = {}
                         self.set_ui_processing_color(Color.GREEN, Status.PROCESSED)
                         break
                 else:
                     self.processing = False
                     self.set_global_element_value(UI_SUBMIT, False)
                     self.set_ui_processing_color(Color.RED, Status.FAILED)
+                    self.record_submission(Status.FAILED)
+                    self.full_res_pending.pop(self.proxy_key, None)
+                    self.proxy_key = None
+                    self.full_res_key = None
                     break
         else:
             if self.processing:
@@ -435,6 +697,299 @@ class ComfyUIBaseClass(pybox.BaseClass):
                 self.set_global_element_value(UI_SUBMIT, False)
             else:
                 self.set_ui_processing_color(Color.GRAY, Status.IDLE)
+        if not self.processing and self.queue_full_res_workflow():
+            self.set_ui_processing_color(Color.YELLOW, Status.FULL_RES)
+    
+    
+    ###################################
+    # Proxy
+    
+    
+    def set_proxy_info(self):
+        if self.get_global_element(UI_PROXY):
+            self.proxy = bool(self.get_global_element_value(UI_PROXY))
+        if self.get_global_element(UI_PROXY_FACTOR):
+            self.proxy_factor = PROXY_FACTORS[int(self.get_global_element_value(UI_PROXY_FACTOR))]
+    
+    
+    def get_proxy_operator_name(self):
+        return self.operator_name + PROXY_SUFFIX
+    
+    
+    def scale_proxy_dimension(self, dimension, factor):
+        scaled = int(dimension) // factor
+        return max(PROXY_RESOLUTION_ALIGN, scaled - scaled % PROXY_RESOLUTION_ALIGN)
+    
+    
+    def set_workflow_proxy_resolution(self, workflow, factor=None):
+        factor = factor if factor else self.proxy_factor
+        for node in workflow.values():
+            inputs = node.get("inputs", {})
+            for field in ["width", "height"]:
+                if isinstance(inputs.get(field), int):
+                    inputs[field] = self.scale_proxy_dimension(inputs[field], factor)
+    
+    
+    def get_workflow_links(self, workflow, idx):
+        return [(inputs, field) for inputs in [node.get("inputs", {}) for node in workflow.values()] 
+                for field, value in inputs.items() 
+                if isinstance(value, list) and len(value) == 2 and value[0] == idx]
+    
+    
+    def set_workflow_proxy_input(self, workflow):
+        load_idx = self.workflow_load_exr_front_idx
+        if load_idx not in workflow:
+            return True
+        load_links = self.get_workflow_links(workflow, load_idx)
+        if any([inputs[field][1] != 0 for inputs, field in load_links]):
+            print(f"Workflow LoadEXR {load_idx} outputs other than the image cannot be scaled")
+            return False
+        scale_idx = PROXY_SCALE_IDX
+        count = 1
+        while scale_idx in workflow:
+            scale_idx = PROXY_SCALE_IDX + "_" + str(count)
+            count += 1
+        for inputs, field in load_links:
+            inputs[field] = [scale_idx, 0]
+        workflow[scale_idx] = {
+            "class_type": "ImageScaleBy",
+            "inputs": {
+                "upscale_method": "area",
+                "scale_by": 1.0 / self.proxy_factor,
+                "image": [load_idx, 0]
+                }
+            }
+        return True
+    
+    
+    def get_proxy_workflow(self):
+        workflow = copy.deepcopy(self.workflow)
+        if not self.set_workflow_proxy_input(workflow):
+            return {}
+        self.set_workflow_proxy_resolution(workflow)
+        self.set_workflow_save_exr_filename_prefix(layers=self.operator_layers, 
+                                                   workflow=workflow, 
+                                                   operator=self.get_proxy_operator_name())
+        return workflow
+    
+    
+    def init_proxy(self):
+        self.proxy_key = None
+        self.full_res_pending = {}
+        self.full_res_key = None
+        self.full_res_entry = {}
+    
+    
+    def drop_full_res_workflow(self, frame):
+        for full_res_key in [key for key in self.full_res_pending if key[1] == frame]:
+            print(f'Workflow full resolution v{full_res_key[0]} - f{frame} superseded')
+            del self.full_res_pending[full_res_key]
+    
+    
+    def get_settled_full_res_key(self):
+        now = time.time()
+        for full_res_key, entry in self.full_res_pending.items():
+            if entry["proxy_done_at"] and now - entry["proxy_done_at"] >= PROXY_SETTLE_DELAY:
+                return full_res_key
+        return None
+    
+    
+    def queue_full_res_workflow(self):
+        full_res_key = self.get_settled_full_res_key()
+        if not full_res_key:
+            return False
+        self.set_host_info()
+        entry = self.full_res_pending.pop(full_res_key)
+        version, frame = full_res_key
+        print(f'Workflow full resolution v{version} - f{frame} queueing on {self.server_address} with client id {self.client_id}')
+        self.prompt_id = queue_prompt(entry["workflow"], self.client_id, server_address=self.server_address)
+        print(f'Workflow full resolution assigned prompt id {self.prompt_id}')
+        self.processing = bool(self.prompt_id)
+        if self.processing:
+            self.full_res_key = full_res_key
+            self.full_res_entry = entry
+            self.submission = self.get_submission(self.prompt_id, entry["workflow"], int(version), int(frame))
+        return self.processing
+    
+    
+    def interrupt_full_res_workflow(self):
+        version, frame = self.full_res_key
+        print(f'Workflow full resolution v{version} - f{frame} interruption')
+        self.record_submission(Status.INTERRUPTED)
+        response = interrupt_execution(self.prompt_id, self.client_id, self.server_address)
+        print(f"Workflow execution interrupted on server {self.server_address} ({response})")
+        self.full_res_pending[self.full_res_key] = self.full_res_entry
+        self.full_res_key = None
+        self.full_res_entry = {}
+        self.processing = False
+    
+    
+    ###################################
+    # Warm-up
+    
+    
+    def stage_warmup_input(self):
+        filename = Path(self.in_default_filepath).name
+        staged_path = self.get_operator_path(EndPoint.IN)
+        staged_path.mkdir(parents=True, exist_ok=True)
+        shutil.copy(self.in_default_filepath, staged_path / filename)
+        return str(Path(COMFYUI_SERVER_INPUT_DIR) / self.get_project() / self.operator_name / filename)
+    
+    
+    def get_warmup_workflow(self):
+        workflow = copy.deepcopy(self.workflow)
+        if self.workflow_load_exr_front_idx in workflow:
+            workflow.get(self.workflow_load_exr_front_idx)["inputs"]["filepath"] = self.stage_warmup_input()
+        self.set_workflow_proxy_resolution(workflow, WARMUP_FACTOR)
+        for node in workflow.values():
+            inputs = node.get("inputs", {})
+            if isinstance(inputs.get("steps"), int):
+                inputs["steps"] = WARMUP_STEPS
+        self.get_version_path(EndPoint.OUT, self.operator_name + WARMUP_SUFFIX).mkdir(parents=True, exist_ok=True)
+        self.set_workflow_save_exr_filename_prefix(layers=self.operator_layers, 
+                                                   workflow=workflow, 
+                                                   operator=self.operator_name + WARMUP_SUFFIX)
+        return workflow
+    
+    
+    def warm_up_workflow(self):
+        host_key = (self.server_address, self.operator_name)
+        if (not self.operator_warmup or not self.workflow or 
+            host_key in self.warmed_up or host_key in self.warmup_prompts):
+            return
+        print(f'Workflow warm-up queueing on {self.server_address} with client id {self.client_id}')
+        workflow = self.get_warmup_workflow()
+        warmup_prompt_id = queue_prompt(workflow, self.client_id, server_address=self.server_address)
+        print(f'Workflow warm-up assigned prompt id {warmup_prompt_id}')
+        if warmup_prompt_id:
+            submission = self.get_submission(warmup_prompt_id, workflow, self.get_version(), 
+                                             self.get_frame() if not self.operator_static else 0, 
+                                             warmup=True)
+            self.warmup_prompts[host_key] = (self.client_id, warmup_prompt_id, submission)
+    
+    
+    def update_warmup_execution(self):
+        host_key = (self.server_address, self.operator_name)
+        if host_key not in self.warmup_prompts:
+            return
+        client_id, warmup_prompt_id, submission = self.warmup_prompts[host_key]
+        print(f'Workflow warm-up execution status')
+        while(True):
+            response = prompt_execution(self.server_address, client_id, warmup_prompt_id["prompt_id"])
+            if not response:
+                print(f'Workflow warm-up failed on {self.server_address}')
+                self.record_submission(Status.FAILED, submission)
+                break
+            if not (response["node"] and 
+                    response["node"]["type"] in [ComfyUIStatus.EXECUTING, 
+                                                 ComfyUIStatus.EXECUTION_CACHED]):
+                print(f'Workflow warm-up processed on {self.server_address}')
+                self.warmed_up.add(host_key)
+                self.record_submission(Status.PROCESSED, submission)
+                break
+            if not submission["started_at"]:
+                submission["started_at"] = time.time()
+        del self.warmup_prompts[host_key]
+    
+    
+    ###################################
+    # Ledger
+    
+    
+    def init_ledger(self):
+        if self.ledger:
+            self.ledger.close()
+        self.ledger = None
+        project_path = self.get_project_path(EndPoint.OUT)
+        try:
+            project_path.mkdir(parents=True, exist_ok=True)
+            self.ledger = RenderLedger(project_path / LEDGER_FILENAME)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Render ledger unavailable in {project_path} ({e})")
+    
+    
+    def get_workflow_hash(self, workflow):
+        workflow = copy.deepcopy(workflow)
+        if self.workflow_load_exr_front_idx in workflow:
+            workflow.get(self.workflow_load_exr_front_idx)["inputs"].pop("filepath", None)
+        for save_idx in [self.workflow_save_exr_result_idx, self.workflow_save_exr_outmatte_idx]:
+            if save_idx in workflow:
+                for field in ["filename_prefix", "version", "start_frame"]:
+                    workflow.get(save_idx)["inputs"].pop(field, None)
+        return hashlib.sha256(json.dumps(workflow, sort_keys=True).encode()).hexdigest()
+    
+    
+    def get_workflow_models(self, workflow):
+        return sorted(set([value for node in workflow.values() 
+                           for field, value in node.get("inputs", {}).items() 
+                           if field in LEDGER_MODEL_FIELDS and isinstance(value, str)]))
+    
+    
+    def get_submission(self, prompt_id, workflow, version, frame, proxy=False, warmup=False):
+        if proxy:
+            output_operator = self.get_proxy_operator_name()
+        elif warmup:
+            output_operator = self.operator_name + WARMUP_SUFFIX
+        else:
+            output_operator = self.operator_name
+        return {
+            "prompt_id": prompt_id["prompt_id"],
+            "operator": self.operator_name,
+            "output_operator": output_operator,
+            "version": version,
+            "frame": frame,
+            "workflow_hash": self.get_workflow_hash(workflow),
+            "models": self.get_workflow_models(workflow),
+            "host": self.server_address,
+            "proxy": proxy,
+            "warmup": warmup,
+            "submitted_at": time.time(),
+            "started_at": 0.0,
+            }
+    
+    
+    def get_output_size(self, layer, submission):
+        if layer not in self.operator_layers:
+            return None
+        _, filepath_pttrn, _ = self.get_out_socket_info(layer)
+        version = self.pad(submission["version"], self.version_padding)
+        frame = self.pad(submission["frame"], self.frame_padding)
+        filepath = self.instanciate_filepath(filepath_pttrn, submission["output_operator"], version, frame)
+        return filepath.stat().st_size if filepath.is_file() else None
+    
+    
+    def record_submission(self, status, submission=None):
+        submission = submission if submission else self.submission
+        if not self.ledger or not submission:
+            return
+        queue_wait = None
+        execution_time = None
+        if submission["started_at"]:
+            queue_wait = submission["started_at"] - submission["submitted_at"]
+        timings = self.get_prompt_timings(submission["prompt_id"])
+        if timings:
+            execution_time = timings[1] - timings[0]
+        elif submission["started_at"]:
+            execution_time = time.time() - submission["started_at"]
+        render = {
+            "prompt_id": submission["prompt_id"],
+            "operator": submission["operator"],
+            "version": submission["version"],
+            "frame": submission["frame"],
+            "workflow_hash": submission["workflow_hash"],
+            "host": submission["host"],
+            "proxy": int(submission["proxy"]),
+            "status": status,
+            "submitted_at": submission["submitted_at"],
+            "queue_wait": queue_wait,
+            "execution_time": execution_time,
+            "result_size": self.get_output_size(LayerOut.RESULT, submission),
+            "matte_size": self.get_output_size(LayerOut.OUTMATTE, submission),
+            "warmup": int(submission["warmup"]),
+            }
+        self.ledger.record(render, submission["models"])
+        if submission is self.submission:
+            self.submission = {}
     
     
     ###################################
@@ -445,12 +1000,12 @@ class ComfyUIBaseClass(pybox.BaseClass):
         return Path(COMFYUI_IO_DIR[end_point]) / project 
     
     
-    def get_operator_path(self, side):
-        return self.get_project_path(side) / self.operator_name 
+    def get_operator_path(self, side, operator=None):
+        return self.get_project_path(side) / (operator if operator else self.operator_name)
     
     
-    def get_version_path(self, side=EndPoint.OUT):
-        return self.get_operator_path(side) / self.get_version_str()
+    def get_version_path(self, side=EndPoint.OUT, operator=None):
+        return self.get_operator_path(side, operator) / self.get_version_str()
     
     
     def set_basename(self):
@@ -570,6 +1125,8 @@ class ComfyUIBaseClass(pybox.BaseClass):
     
     def set_file_out(self, layers=[LayerOut.RESULT]):
         self.remove_out_sockets()
+        self.delivered_outputs = {}
+        self.output_polls = {}
         out_layers = list(filter(lambda l: isinstance(l, LayerOut), layers))
         if not out_layers:
             self.set_out_socket(0, "undefined", "")
@@ -592,13 +1149,35 @@ class ComfyUIBaseClass(pybox.BaseClass):
         version = self.get_version_str()
         frame = self.get_frame_str() if not self.operator_static else self.pad(0, self.frame_padding)
         src_filepath = self.instanciate_filepath(filepath_pttrn, operator, version, frame)
+        if self.proxy and not self.output_frame_complete(src_filepath):
+            src_filepath = self.instanciate_filepath(filepath_pttrn, self.get_proxy_operator_name(), version, frame)
         print(f"Testing {str(src_filepath)}")
-        if src_filepath.is_file():    
+        if self.output_frame_complete(src_filepath):    
             socket_filepath = tempfile.gettempdir() + "/" + socket_filename
             self.set_out_socket(socket_idx, layer, socket_filepath)
+            src_stat = src_filepath.stat()
+            delivered = (str(src_filepath), src_stat.st_mtime, src_stat.st_size)
+            if self.delivered_outputs.get(layer) == delivered and Path(socket_filepath).is_file():
+                return
             print(f"Copying {src_filepath}")
             print(f"     to {socket_filepath} socket file")
-            shutil.copy(src_filepath, socket_filepath)
+            shutil.copy(src_filepath, socket_filepath + ".tmp")
+            os.replace(socket_filepath + ".tmp", socket_filepath)
+            self.delivered_outputs[layer] = delivered
+    
+    
+    def output_frame_complete(self, filepath):
+        if not filepath.is_file():
+            return False
+        stat = filepath.stat()
+        output_poll = (stat.st_size, stat.st_mtime)
+        previous_poll = self.output_polls.get(str(filepath))
+        self.output_polls[str(filepath)] = output_poll
+        if not stat.st_size:
+            return False
+        if not self.processing:
+            return True
+        return previous_poll == output_poll
     
 
     def update_outputs(self, layers=[LayerOut.RESULT, LayerOut.OUTMATTE]):
@@ -616,6 +1195,7 @@ class ComfyUIBaseClass(pybox.BaseClass):
         self.init_version()
         self.set_file_in(layers=self.operator_layers)
         self.set_file_out(layers=self.operator_layers)
+        self.init_ledger()
     
     
     def frame_exists(self, operator, layer, version, frame):
@@ -692,10 +1272,12 @@ class ComfyUIBaseClass(pybox.BaseClass):
         
         self.init_host_info()
         self.init_client()
+        self.init_proxy()
         self.init_workflow()
         self.set_file_io()
         self.set_models()
         self.load_workflow()
+        self.warm_up_workflow()
         self.init_ui()
 
         self.print_flame_metadata()
@@ -724,6 +1306,11 @@ class ComfyUIBaseClass(pybox.BaseClass):
             elif elem["name"] == UI_INCVER:
                 if self.get_global_element_value(UI_INCVER):
                     self.increment_version()
+            elif elem["name"] in [UI_HOSTNAME, UI_HOSTPORT]:
+                server_address = self.server_address
+                self.set_host_info()
+                if self.server_address != server_address:
+                    self.warm_up_workflow()
         
         self.print_flame_metadata()
     
@@ -734,4 +1321,8 @@ class ComfyUIBaseClass(pybox.BaseClass):
         print("____________________")
         self.print_date_time()
         print("____________________")
+        
+        if self.ledger:
+            self.ledger.close()
+            self.ledger = None
         
\ No newline at end of file